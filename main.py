@@ -4,11 +4,18 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
+import re
+import signal
+import sys
 from contextlib import suppress
-from typing import Any
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
 
 import httpx
+import msgspec
+import orjson
 from aiogram import Bot, Dispatcher, F, Router
+from cachetools import LRUCache, TTLCache
 from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
 from aiogram.types import Message, Update
@@ -45,7 +52,22 @@ class MockAPIClient:
     """Лёгкая обёртка вокруг httpx с ретраями и логированием."""
 
     def __init__(self, base_url: str):
-        self._client = httpx.AsyncClient(base_url=base_url, timeout=10.0)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            # один клиент обслуживает все хендлеры: держим keep-alive подольше,
+            # чтобы не платить TCP/TLS-handshake на каждый всплеск апдейтов
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=15.0,
+            ),
+            http2=True,
+        )
+        # мок-данные детерминированы, поэтому GET-ответы можно недолго кешировать
+        self._cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+        # одновременные одинаковые GET ждут один общий запрос, а не дублируют его
+        self._inflight: dict[tuple, asyncio.Future] = {}
 
     async def aclose(self) -> None:
         await self._client.aclose()
@@ -59,7 +81,7 @@ class MockAPIClient:
             try:
                 resp = await self._client.request(method, url, **kw)
                 resp.raise_for_status()
-                return resp.json()
+                return orjson.loads(resp.content)
             except (httpx.ConnectError, httpx.ReadTimeout) as e:
                 last_exc = e
                 if attempt < 2:
@@ -83,18 +105,92 @@ class MockAPIClient:
         raise last_exc
 
     async def get(self, url: str, params: dict[str, Any] | None = None) -> Any:
-        return await self._request("GET", url, params=params)
+        # кешируем только идемпотентные GET; POST всегда идёт в сеть
+        key = (url, tuple(sorted((params or {}).items())))
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await pending
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            res = await self._request("GET", url, params=params)
+        except BaseException as e:
+            fut.set_exception(e)
+            # ошибка уже уходит первичному вызывающему — без ожидающих
+            # future не должен ругаться "exception was never retrieved"
+            fut.add_done_callback(lambda f: f.exception())
+            raise
+        else:
+            self._cache[key] = res
+            fut.set_result(res)
+            return res
+        finally:
+            del self._inflight[key]
 
     async def post(self, url: str, payload: dict[str, Any]) -> Any:
-        return await self._request("POST", url, json=payload)
+        # сериализуем сами через orjson вместо stdlib json внутри httpx
+        return await self._request(
+            "POST",
+            url,
+            content=orjson.dumps(payload),
+            headers={"content-type": "application/json"},
+        )
 
 
-API: MockAPIClient | None = None  # инициализируем в on_startup()
+# Инициализируем в on_startup(): httpx привязывает пул соединений к текущему
+# event loop, поэтому клиент нельзя создавать на уровне модуля до asyncio.run().
+API: MockAPIClient | None = None
 
 # -----------------------------
 # State
 # -----------------------------
-user_mode: dict[int, str] = {}  # user_id -> ecom|realty|clinic
+# user_id -> ecom|realty|clinic. LRU вместо dict, чтобы память не росла
+# бесконечно с числом уникальных пользователей: редкие гости вытесняются,
+# для них просто сработает режим по умолчанию ("ecom").
+user_mode: LRUCache = LRUCache(maxsize=100_000)
+
+# -----------------------------
+# Intent matching
+# -----------------------------
+# Один скомпилированный паттерн на режим: один проход по тексту вместо
+# каскада substring-проверок, имя сработавшей группы определяет интент.
+INTENT_RE: dict[str, re.Pattern[str]] = {
+    "ecom": re.compile(r"(?P<order>где мой заказ|заказ #)|(?P<ret>вернуть|возврат)"),
+    "realty": re.compile(r"(?P<search>квартира|2-к|2к)|(?P<book>бронь|заброни)"),
+    "clinic": re.compile(r"(?P<slots>болит горло|температура)|(?P<book>18:00)"),
+}
+
+_DIGITS_RE = re.compile(r"\d+")
+
+# -----------------------------
+# Static reply texts
+# -----------------------------
+# Константные части ответов один раз живут на уровне модуля: aiogram не
+# пересобирает строку на каждый вызов, динамика конкатенируется к готовой базе.
+START_TEXT = (
+    "Демо-бот запущен.\n"
+    "Доступные режимы: ecom | realty | clinic\n\n"
+    "Напишите один из режимов, чтобы переключиться."
+)
+FALLBACK_TEXT = "Для демо попробуйте сценарии из выбранного режима."
+API_ERROR_TEXT = "Сервис временно недоступен, попробуйте позже."
+UNEXPECTED_ERROR_TEXT = "Что-то пошло не так. Попробуйте ещё раз чуть позже."
+REALTY_BOOK_OK = "Бронь подтверждена. Приглашение отправлено."
+REALTY_BOOK_FAIL = "Не удалось забронировать, попробуйте позже."
+REALTY_SEARCH_HEADER = "Подходящие варианты:\n"
+REALTY_SEARCH_FOOTER = "\n\nБронируем APT-202 завтра 19:00?"
+DOCTOR_HEADER = (
+    "Это не медицинская консультация. Рекомендую очный приём у ЛОР.\n"
+    "Доступные слоты: "
+)
+CLINIC_BOOK_OK = "Запись подтверждена. Номер талона CLN-5521."
+CLINIC_BOOK_FAIL = "Не удалось записать, попробуйте позже."
 
 # -----------------------------
 # Router
@@ -107,22 +203,104 @@ async def on_start(m: Message) -> None:
     if not m.from_user:
         return
     user_mode[m.from_user.id] = "ecom"
-    await m.answer(
-        "Демо-бот запущен.\n"
-        "Доступные режимы: ecom | realty | clinic\n\n"
-        "Напишите один из режимов, чтобы переключиться.",
-    )
+    await m.answer(START_TEXT)
 
 
-@router.message(F.text.lower().in_({"ecom", "realty", "clinic"}))
+@router.message(F.text.casefold().in_({"ecom", "realty", "clinic"}))
 async def switch_mode(m: Message) -> None:
     if not m.from_user or not m.text:
         return
-    mode = m.text.lower()
+    # casefold() возвращает новую строку на каждый апдейт; intern схлопывает
+    # их в три канонических объекта на весь процесс
+    mode = sys.intern(m.text.casefold())
     user_mode[m.from_user.id] = mode
     await m.answer(f"Режим переключен на: {mode}. Спросите что-нибудь по сценарию.")
 
 
+# ---- E-COM
+async def _ecom_order(m: Message, text: str) -> None:
+    m_digits = _DIGITS_RE.search(text)
+    digits = m_digits.group(0) if m_digits else "1234"
+    data = await API.get("/mock/ecom/order", {"order_id": digits})
+    await m.answer(f"Заказ #{data.get('order_id')}: {data.get('status')}, ETA {data.get('eta')}")
+
+
+async def _ecom_return(m: Message, text: str) -> None:
+    # возврат и апселл независимы — выполняем параллельно
+    # (по HTTP/2 оба запроса мультиплексируются в одном соединении)
+    res, rel = await asyncio.gather(
+        API.post(
+            "/mock/ecom/return",
+            {"order_id": "1234", "item_sku": "HOO-XL", "reason": "size", "condition": "new"},
+        ),
+        API.get("/mock/ecom/related", {"sku": "HOO-XL", "limit": 3}),
+        return_exceptions=True,
+    )
+    if isinstance(res, BaseException):
+        raise res  # возврат обязателен, апселл — нет
+    await m.answer(f"Создан возврат: {res.get('rma')} — этикетка: {res.get('label_url')}")
+    if isinstance(rel, BaseException):
+        log.warning("related-items lookup failed: %s", rel)
+        return
+    upsell = ", ".join(x.get("name", "") for x in rel if isinstance(x, dict))
+    if upsell:
+        await m.answer(f"Рекомендую добавить к заказу: {upsell}. Нужна помощь?")
+
+
+# ---- REALTY
+@lru_cache(maxsize=256)
+def _render_listings(listings: tuple[tuple[Any, int, str], ...]) -> str:
+    """Отрендерить превью лотов; данные статичны, результат кешируется."""
+    return "\n".join(
+        f"{id_}: {price:,} ₽ — {address}".replace(",", " ")
+        for id_, price, address in listings
+    )
+
+
+async def _realty_search(m: Message, text: str) -> None:
+    lst = await API.get(
+        "/mock/realty/search",
+        {"budget_max": 15_000_000, "district": "ЮЗАО", "rooms": 2, "mortgage": True},
+    )
+    preview = _render_listings(
+        tuple((x.get("id"), int(x.get("price", 0)), x.get("address", "")) for x in lst)
+    )
+    await m.answer(REALTY_SEARCH_HEADER + preview + REALTY_SEARCH_FOOTER)
+
+
+async def _realty_book(m: Message, text: str) -> None:
+    res = await API.post(
+        "/mock/realty/book",
+        {"listing_id": "APT-202", "datetime": "2025-08-21T19:00", "name": "Илья", "phone": "+7..."},
+    )
+    await m.answer(REALTY_BOOK_OK if res.get("status") == "booked" else REALTY_BOOK_FAIL)
+
+
+# ---- CLINIC
+async def _clinic_slots(m: Message, text: str) -> None:
+    data = await API.get("/mock/clinic/slots", {"speciality": "лор", "date_from": "2025-08-20"})
+    slots = data if isinstance(data, list) else data.get("slots", [])
+    human = ", ".join(slots) if slots else "слотов нет"
+    await m.answer(DOCTOR_HEADER + human)
+
+
+async def _clinic_book(m: Message, text: str) -> None:
+    res = await API.post(
+        "/mock/clinic/book",
+        {"speciality": "лор", "datetime": "2025-08-20T18:00", "name": "Олег", "phone": "+7..."},
+    )
+    await m.answer(CLINIC_BOOK_OK if res.get("status") == "booked" else CLINIC_BOOK_FAIL)
+
+
+# Имя группы из INTENT_RE -> корутина-обработчик. Новый интент = строка в
+# паттерне + запись здесь, hot path при этом не трогаем.
+HANDLERS: dict[str, dict[str, Callable[[Message, str], Awaitable[None]]]] = {
+    "ecom": {"order": _ecom_order, "ret": _ecom_return},
+    "realty": {"search": _realty_search, "book": _realty_book},
+    "clinic": {"slots": _clinic_slots, "book": _clinic_book},
+}
+
+
 @router.message(F.text)
 async def handle_text(m: Message) -> None:
     if not m.from_user:
@@ -130,87 +308,25 @@ async def handle_text(m: Message) -> None:
     assert API is not None, "API client not initialized"
 
     mode = user_mode.get(m.from_user.id, "ecom")
-    text = (m.text or "").lower()
+    # единственный .lower() на сообщение: дальше все обработчики получают
+    # уже нормализованный текст
+    text = m.text.lower() if m.text else ""
+
+    matched = INTENT_RE[mode].search(text) if mode in INTENT_RE else None
 
     try:
-        # ---- E-COM
-        if mode == "ecom":
-            if "где мой заказ" in text or "заказ #" in text:
-                digits = "".join(ch for ch in text if ch.isdigit()) or "1234"
-                data = await API.get("/mock/ecom/order", {"order_id": digits})
-                await m.answer(f"Заказ #{data.get('order_id')}: {data.get('status')}, ETA {data.get('eta')}")
-                return
-
-            if "вернуть" in text or "возврат" in text:
-                res = await API.post(
-                    "/mock/ecom/return",
-                    {"order_id": "1234", "item_sku": "HOO-XL", "reason": "size", "condition": "new"},
-                )
-                await m.answer(f"Создан возврат: {res.get('rma')} — этикетка: {res.get('label_url')}")
-                rel = await API.get("/mock/ecom/related", {"sku": "HOO-XL", "limit": 3})
-                upsell = ", ".join(x.get("name", "") for x in rel if isinstance(x, dict))
-                if upsell:
-                    await m.answer(f"Рекомендую добавить к заказу: {upsell}. Нужна помощь?")
-                return
-
-        # ---- REALTY
-        if mode == "realty":
-            if any(k in text for k in ("квартира", "2-к", "2к")):
-                lst = await API.get(
-                    "/mock/realty/search",
-                    {"budget_max": 15_000_000, "district": "ЮЗАО", "rooms": 2, "mortgage": True},
-                )
-                preview = "\n".join(
-                    f"{x.get('id')}: {int(x.get('price', 0)):,} ₽ — {x.get('address','')}".replace(",", " ")
-                    for x in lst
-                )
-                await m.answer(f"Подходящие варианты:\n{preview}\n\nБронируем APT-202 завтра 19:00?")
-                return
-
-            if "бронь" in text or "заброни" in text:
-                res = await API.post(
-                    "/mock/realty/book",
-                    {"listing_id": "APT-202", "datetime": "2025-08-21T19:00", "name": "Илья", "phone": "+7..."},
-                )
-                await m.answer(
-                    "Бронь подтверждена. Приглашение отправлено."
-                    if res.get("status") == "booked"
-                    else "Не удалось забронировать, попробуйте позже."
-                )
-                return
-
-        # ---- CLINIC
-        if mode == "clinic":
-            if "болит горло" in text or "температура" in text:
-                data = await API.get("/mock/clinic/slots", {"speciality": "лор", "date_from": "2025-08-20"})
-                slots = data if isinstance(data, list) else data.get("slots", [])
-                human = ", ".join(slots) if slots else "слотов нет"
-                await m.answer(
-                    "Это не медицинская консультация. Рекомендую очный приём у ЛОР.\n"
-                    f"Доступные слоты: {human}"
-                )
-                return
-
-            if "на 18:00" in text or "18:00" in text:
-                res = await API.post(
-                    "/mock/clinic/book",
-                    {"speciality": "лор", "datetime": "2025-08-20T18:00", "name": "Олег", "phone": "+7..."},
-                )
-                await m.answer(
-                    "Запись подтверждена. Номер талона CLN-5521."
-                    if res.get("status") == "booked"
-                    else "Не удалось записать, попробуйте позже."
-                )
-                return
+        if matched and matched.lastgroup:
+            await HANDLERS[mode][matched.lastgroup](m, text)
+            return
 
         # ---- fallback
-        await m.answer("Для демо попробуйте сценарии из выбранного режима.")
+        await m.answer(FALLBACK_TEXT)
     except httpx.HTTPError as e:
         log.exception("API error: %s", e)
-        await m.answer("Сервис временно недоступен, попробуйте позже.")
+        await m.answer(API_ERROR_TEXT)
     except Exception as e:
         log.exception("Unexpected error: %s", e)
-        await m.answer("Что-то пошло не так. Попробуйте ещё раз чуть позже.")
+        await m.answer(UNEXPECTED_ERROR_TEXT)
 
 
 # -----------------------------
@@ -228,6 +344,11 @@ async def on_startup() -> None:
     global API
     API = MockAPIClient(API_BASE)
 
+    # прогреваем пул: TCP/TLS-handshake происходит сейчас, а не на первом
+    # сообщении пользователя; при недоступном API просто стартуем холодными
+    with suppress(Exception):
+        await API.get("/healthz")
+
     if USE_WEBHOOK:
         url = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
         await BOT.set_webhook(url, secret_token=(WEBHOOK_SECRET or None))
@@ -246,21 +367,74 @@ async def on_shutdown() -> None:
     log.info("Shutdown complete")
 
 
+# тело ответа healthz не меняется — сериализуем один раз, а не на каждую
+# пробу Render'а
+_HEALTH_BODY = b'{"ok":true}'
+
+
 def build_aiohttp_app() -> web.Application:
     app = web.Application()
 
     async def health(_req: web.Request) -> web.StreamResponse:
-        return web.json_response({"ok": True})
+        return web.Response(body=_HEALTH_BODY, content_type="application/json")
+
+    app.router.add_get("/healthz", health)
+
+    # Апдейты не обрабатываем в запросе: складываем в очередь и сразу отвечаем
+    # Telegram "ok", а фоновый потребитель разбирает накопившееся батчами —
+    # фиксированные накладные расходы (валидация, диспетчеризация) платим
+    # по разу на батч, а не на каждый POST.
+    queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+    # ограничитель на число одновременно обрабатываемых апдейтов: медленный
+    # /mock/* не должен породить неограниченную кучу задач
+    dispatch_sem = asyncio.Semaphore(200)
+    # strong refs, иначе event loop может собрать задачу до завершения
+    dispatch_tasks: set[asyncio.Task] = set()
 
     async def handle(request: web.Request) -> web.StreamResponse:
         if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
             return web.Response(status=403, text="forbidden")
-        data = await request.json()
-        update = Update.model_validate(data)
-        await DP.feed_update(BOT, update)
+        # msgspec парсит сырые байты заметно быстрее stdlib-пути request.json()
+        queue.put_nowait(msgspec.json.decode(await request.read()))
         return web.Response(text="ok")
 
-    app.router.add_get("/healthz", health)
+    async def _dispatch(update: Update) -> None:
+        async with dispatch_sem:
+            await DP.feed_update(BOT, update)
+
+    def _on_dispatch_done(task: asyncio.Task) -> None:
+        dispatch_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("update processing failed", exc_info=task.exception())
+
+    async def drain() -> None:
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty() and len(batch) < 32:
+                batch.append(queue.get_nowait())
+
+            updates: list[Update] = []
+            for data in batch:
+                try:
+                    updates.append(Update.model_validate(data))
+                except Exception:
+                    log.exception("invalid update payload, skipping")
+
+            # fire-and-forget: потребитель не ждёт обработчиков, долгий
+            # апдейт не задерживает следующий батч
+            for update in updates:
+                task = asyncio.create_task(_dispatch(update))
+                dispatch_tasks.add(task)
+                task.add_done_callback(_on_dispatch_done)
+
+    async def _drain_ctx(_app: web.Application):
+        task = asyncio.create_task(drain())
+        yield
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    app.cleanup_ctx.append(_drain_ctx)
     app.router.add_post(WEBHOOK_PATH, handle)
     return app
 
@@ -276,9 +450,14 @@ async def main() -> None:
         site = web.TCPSite(runner, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
         await site.start()
         log.info("Webhook server started on 0.0.0.0:%s", os.getenv("PORT", "8000"))
+        # держим процесс на Event вместо цикла sleep: ноль холостых пробуждений
+        # и мгновенная реакция на SIGTERM от Render вместо ожидания до часа
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
         try:
-            while True:
-                await asyncio.sleep(3600)
+            await stop.wait()
         finally:
             with suppress(Exception):
                 await runner.cleanup()
@@ -5,14 +5,18 @@ from __future__ import annotations
 from enum import Enum
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Query, status
+import numpy as np
+
+from fastapi import FastAPI, HTTPException, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field, constr
 
 app = FastAPI(
     title="AI Demo Agents — Mock API",
     version="1.0.0",
     description="Статические, предсказуемые моки для e-com, недвижимости и клиники.",
+    default_response_class=ORJSONResponse,
 )
 
 # --- Middleware (CORS для удобства) ---
@@ -30,9 +34,14 @@ class Health(BaseModel):
     ok: bool = True
 
 
-@app.get("/healthz", response_model=Health, tags=["health"], summary="Healthcheck")
-def healthz() -> Health:
-    return Health()
+# Пробы приходят каждые несколько секунд: отдаём заранее сериализованные
+# байты вместо построения Pydantic-модели на каждый запрос.
+_HEALTH_BODY = ORJSONResponse(Health().model_dump()).body
+
+
+@app.get("/healthz", tags=["health"], summary="Healthcheck")
+def healthz() -> Response:
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 # =========================
 # 1) E-COMMERCE
@@ -157,6 +166,11 @@ _LISTINGS: list[Listing] = [
     Listing(id="APT-303", price=13_900_000, address="pr. Vernadskogo, 19", rooms=2, area=48),
 ]
 
+# Колоночное представление для фильтрации: булевы маски по numpy-массивам
+# вместо прохода по Pydantic-объектам — масштабируется на тысячи лотов.
+_PRICES = np.array([x.price for x in _LISTINGS], dtype=np.int64)
+_ROOMS = np.array([x.rooms for x in _LISTINGS], dtype=np.int8)
+
 
 @app.get(
     "/mock/realty/search",
@@ -170,10 +184,10 @@ def search_listings(
     rooms: Optional[int] = Query(None, ge=1, le=10),
     _mortgage: Optional[bool] = Query(None, description="Заглушка"),
 ) -> List[Listing]:
-    result = [x for x in _LISTINGS if x.price <= budget_max]
+    mask = _PRICES <= budget_max
     if rooms:
-        result = [x for x in result if x.rooms == rooms]
-    return result
+        mask &= _ROOMS == rooms
+    return [_LISTINGS[i] for i in np.flatnonzero(mask)]
 
 
 @app.post(
@@ -246,5 +260,5 @@ def clinic_book(_payload: BookAppointmentRequest) -> BookAppointmentResponse:
 # Root helper
 # =========================
 @app.get("/", tags=["health"], include_in_schema=False)
-def root() -> Health:
-    return Health()
\ No newline at end of file
+def root() -> Response:
+    return Response(content=_HEALTH_BODY, media_type="application/json")
\ No newline at end of file